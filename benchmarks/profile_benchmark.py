@@ -0,0 +1,108 @@
+"""
+Benchmark pipeline profiles.
+
+Creates and runs one workflow per profile over the same source and destination
+and records how long each job takes, so the cheapest profile that meets the
+accuracy needs can be chosen. Point UNSTRUCTURED_API_URL at a local stand-in of
+the Unstructured API to benchmark without using the hosted service.
+
+Usage:
+    uv run python -m benchmarks.profile_benchmark SOURCE_ID DESTINATION_ID
+"""
+
+import time
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from file_processing.unstructured_workflow import (
+    UnstructuredPipeline,
+    create_unstructured_http_client,
+)
+from file_processing.pipeline_profiles import load_pipeline_profiles
+
+async def benchmark_profiles(
+    source_id: str,
+    destination_id: str,
+    profiles: list[str],
+    poll_interval: float,
+    timeout: float,
+):
+    """Run every profile once and record its processing time"""
+
+    async with create_unstructured_http_client() as http_client:
+        pipeline = UnstructuredPipeline(http_client)
+        return await run_profiles(
+            pipeline, source_id, destination_id, profiles, poll_interval, timeout
+        )
+
+
+async def run_profiles(
+    pipeline: UnstructuredPipeline,
+    source_id: str,
+    destination_id: str,
+    profiles: list[str],
+    poll_interval: float,
+    timeout: float,
+):
+    """Create and run a workflow per profile, timing each job"""
+
+    results = []
+
+    for profile in profiles:
+        workflow = await pipeline.create_workflow_unstructured(
+            f"benchmark-{profile}", source_id, destination_id, profile=profile
+        )
+
+        previous_job = await pipeline.get_latest_job(workflow.id)
+        previous_job_id = previous_job.id if previous_job else None
+
+        started = time.perf_counter()
+        await pipeline.run_workflow_unstructured(workflow.id)
+        status = await pipeline.wait_for_job(
+            workflow.id, previous_job_id, poll_interval, timeout
+        )
+        elapsed = time.perf_counter() - started
+
+        results.append(
+            {
+                "profile": profile,
+                "workflow_id": workflow.id,
+                "status": status,
+                "seconds": round(elapsed, 3),
+            }
+        )
+        print(f"{profile}: {status} in {elapsed:.3f}s")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline profiles")
+    parser.add_argument("source_id", help="The id of the source connector")
+    parser.add_argument("destination_id", help="The id of the destination connector")
+    parser.add_argument("--profiles", nargs="*", help="Profiles to benchmark, defaults to all")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Seconds to wait for each job")
+    parser.add_argument("--output", default="profile_benchmark.json")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    profiles = args.profiles or list(load_pipeline_profiles())
+    results = asyncio.run(
+        benchmark_profiles(
+            args.source_id,
+            args.destination_id,
+            profiles,
+            args.poll_interval,
+            args.timeout,
+        )
+    )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
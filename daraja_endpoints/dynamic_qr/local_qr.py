@@ -0,0 +1,283 @@
+"""
+Local QR rendering for static M-Pesa codes.
+
+Renders the same MerchantName, RefNo, Amount, TrxCode and CPI fields that
+`qr_code` sends to Daraja into a PNG in-process, so label printing for static
+Buy Goods / Paybill codes does not need a network round trip.
+"""
+
+import os
+import io
+import json
+import base64
+import asyncio
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Literal
+
+# Decoded Daraja QR codes used to verify the local payload format
+CAPTURES_PATH = Path(__file__).parent / "captures"
+
+# Image sizes accepted for local rendering, in pixels
+MIN_QR_SIZE = 100
+MAX_QR_SIZE = 1000
+
+# Process pool used for CPU-bound QR rendering
+_render_pool: ProcessPoolExecutor | None = None
+
+
+def load_qr_captures() -> list[dict]:
+    """
+    Load decoded Daraja QR captures.
+
+    Each capture is a JSON file holding the Daraja "request" fields and the
+    decoded "payload" of the QR code Daraja returned for them.
+
+    Returns:
+        list[dict]: The captures
+    """
+    path = Path(os.getenv("QR_CAPTURES_PATH") or CAPTURES_PATH)
+    return [json.loads(capture.read_text()) for capture in sorted(path.glob("*.json"))]
+
+
+def verified_transaction_types() -> set[str]:
+    """
+    Get the transaction types whose local payload matches every Daraja capture.
+
+    Returns:
+        set[str]: Transaction types with at least one capture and no mismatch.
+    """
+    matched = set()
+    mismatched = set()
+    for capture in load_qr_captures():
+        request = capture["request"]
+        payload = build_qr_payload(
+            request["MerchantName"],
+            request["RefNo"],
+            request["Amount"],
+            request["TrxCode"],
+            request["CPI"],
+        )
+        if payload == capture["payload"]:
+            matched.add(request["TrxCode"])
+        else:
+            mismatched.add(request["TrxCode"])
+    return matched - mismatched
+
+
+def local_qr_transaction_types() -> set[str]:
+    """
+    Get the transaction types that should be rendered locally.
+
+    Configured through QR_LOCAL_TRANSACTION_TYPES as a comma separated list,
+    e.g. "BG,PB". Only types verified against a Daraja capture are rendered
+    locally, all others are generated by Daraja.
+
+    Returns:
+        set[str]: Transaction types to render locally.
+    """
+    value = os.getenv("QR_LOCAL_TRANSACTION_TYPES", "")
+    configured = {code.strip().upper() for code in value.split(",") if code.strip()}
+    if not configured:
+        return set()
+    return configured & verified_transaction_types()
+
+
+def emv_field(tag: str, value) -> str:
+    """Encode one EMVCo tag-length-value field"""
+    value = str(value)
+    if len(value) > 99:
+        raise ValueError(f"QR field {tag} is longer than 99 characters")
+    return f"{tag}{len(value):02d}{value}"
+
+
+def crc16_ccitt(data: str) -> str:
+    """CRC-16/CCITT-FALSE checksum used by EMVCo QR codes, as 4 hex digits"""
+    crc = 0xFFFF
+    for byte in data.encode("utf-8"):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def build_qr_payload(
+    merchant_name: str,
+    transaction_reference_no: str,
+    amount: int,
+    transaction_type: str,
+    credit_party_identifier: str,
+) -> str:
+    """
+    Build the EMVCo merchant-presented payload encoded in a local QR code.
+
+    The tag layout is only trusted for transaction types that match a
+    decoded Daraja capture, see verified_transaction_types.
+
+    Args:
+        merchant_name (str): Name of the company/M-Pesa Merchant Name.
+        transaction_reference_no (str): Transaction reference number.
+        amount (int): The total amount for the sale/transaction.
+        transaction_type (str): Transaction type.
+        credit_party_identifier (str): Credit Party Identifier.
+
+    Returns:
+        str: The QR content, ending with its CRC field
+    """
+    merchant_account = emv_field("00", transaction_type) + emv_field(
+        "01", credit_party_identifier
+    )
+    payload = "".join(
+        [
+            emv_field("00", "01"),  # payload format indicator
+            emv_field("01", "12"),  # dynamic QR, the amount is fixed
+            emv_field("29", merchant_account),
+            emv_field("52", "0000"),  # merchant category code
+            emv_field("53", "404"),  # KES
+            emv_field("54", amount),
+            emv_field("58", "KE"),
+            emv_field("59", merchant_name[:25]),
+            emv_field("62", emv_field("05", transaction_reference_no)),
+        ]
+    )
+
+    # The CRC covers the payload including the CRC tag and length
+    payload += "6304"
+    return payload + crc16_ccitt(payload)
+
+
+def render_qr_png(content: str, size: int) -> str:
+    """
+    Render QR content into a base64 encoded PNG of size x size pixels.
+
+    Every module is drawn with the same whole number of pixels and the code
+    is centred on a white canvas of the requested size.
+
+    Runs inside the render pool, so it only takes and returns plain values.
+
+    Args:
+        content (str): The text to encode.
+        size (int): Image width and height in pixels.
+
+    Returns:
+        str: Base64 encoded PNG image
+    """
+    try:
+        import qrcode
+    except ImportError:
+        raise ValueError(
+            "Local QR rendering requires the optional 'qrcode[pil]' package"
+        )
+
+    from PIL import Image
+
+    qr = qrcode.QRCode(border=4, box_size=1)
+    qr.add_data(content)
+    qr.make(fit=True)
+
+    # Largest whole module size that fits, including the quiet zone
+    qr.box_size = size // (qr.modules_count + 2 * qr.border)
+    if qr.box_size < 1:
+        raise ValueError(f"QR code size {size} is too small for its content")
+
+    code = qr.make_image().get_image()
+    image = Image.new(code.mode, (size, size), "white")
+    offset = (size - code.size[0]) // 2
+    image.paste(code, (offset, offset))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Create the render pool on first use"""
+    global _render_pool
+    if _render_pool is None:
+        max_workers = int(os.getenv("QR_RENDER_WORKERS", "2"))
+        _render_pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    """Shut down the render pool if it was started"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+async def local_qr_code(
+    merchant_name: str,
+    transaction_reference_no: str,
+    amount: int,
+    transaction_type: Literal["BG", "WA", "PB", "SM", "SB"],
+    credit_party_identifier: str,
+    size: str = "300",
+) -> Dict[str, Any]:
+    """
+    Generate a QR code locally without calling Daraja.
+
+    Only transaction types verified against a Daraja capture can be rendered.
+
+    Args:
+        merchant_name (str): Name of the company/M-Pesa Merchant Name.
+
+        transaction_reference_no (str): Transaction reference number.
+
+        amount (int): The total amount for the sale/transaction.
+
+        transaction_type (Literal["BG", "WA", "PB", "SM", "SB"]): Transaction type.
+
+        credit_party_identifier (str): Credit Party Identifier.
+
+        size (str): Image width and height in pixels.
+
+    Returns:
+        Dict[str, Any]: Response shaped like the Daraja QR code response, with the encoded payload
+    """
+
+    # validate required variables
+    if not all(
+        [
+            merchant_name,
+            transaction_reference_no,
+            amount,
+            transaction_type,
+            credit_party_identifier,
+        ]
+    ):
+        raise ValueError("Missing required variables for QR code generation")
+
+    if transaction_type not in verified_transaction_types():
+        raise ValueError(
+            f"Local QR format for {transaction_type} has not been verified against a Daraja capture"
+        )
+
+    size = int(size)
+    if not MIN_QR_SIZE <= size <= MAX_QR_SIZE:
+        raise ValueError(
+            f"QR code size must be between {MIN_QR_SIZE} and {MAX_QR_SIZE} pixels"
+        )
+
+    content = build_qr_payload(
+        merchant_name,
+        transaction_reference_no,
+        amount,
+        transaction_type,
+        credit_party_identifier,
+    )
+
+    # render in the process pool to keep the event loop free
+    loop = asyncio.get_running_loop()
+    image = await loop.run_in_executor(
+        _get_render_pool(), render_qr_png, content, size
+    )
+
+    return {
+        "ResponseCode": "00",
+        "ResponseDescription": "QR Code Successfully Generated.",
+        "QRCode": image,
+        "QRPayload": content,
+    }
@@ -1,6 +1,7 @@
 from typing import Dict, Any, Literal
 import httpx
 import os
+from daraja_endpoints.dynamic_qr.local_qr import local_qr_code, local_qr_transaction_types
 
 
 async def qr_code(
@@ -10,6 +11,7 @@ async def qr_code(
     amount: int,
     transaction_type: Literal["BG", "WA", "PB", "SM", "SB"],
     credit_party_identifier: str,
+    size: str = "300",
 ):
     """
     Generate a QR code for a transaction.
@@ -27,6 +29,8 @@ async def qr_code(
 
         credit_party_identifier (str): Credit Party Identifier.
 
+        size (str): Image width and height in pixels.
+
     Returns:
         str: JSON formatted M-PESA API response
     """
@@ -46,6 +50,17 @@ async def qr_code(
     ):
         raise ValueError("Missing required variables for QR code generation")
 
+    # render locally for transaction types configured for offline generation
+    if transaction_type in local_qr_transaction_types():
+        return await local_qr_code(
+            merchant_name,
+            transaction_reference_no,
+            amount,
+            transaction_type,
+            credit_party_identifier,
+            size,
+        )
+
     # prepare the request
     url = f"{base_url}/mpesa/qrcode/v1/generate"
 
@@ -62,7 +77,7 @@ async def qr_code(
         "Amount": amount,
         "TrxCode": transaction_type,
         "CPI": credit_party_identifier,
-        "Size": "300",
+        "Size": size,
     }
 
     # send request
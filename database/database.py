@@ -1,4 +1,7 @@
 from pymongo.mongo_client import MongoClient
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from datetime import datetime, timezone
+from bson import ObjectId
 from pymongo.server_api import ServerApi
 import os
 from dotenv import load_dotenv
@@ -14,6 +17,8 @@ db = client.daraja_mcp
 
 workflow_collection = db["analyzed_documents"]
 
+payment_candidates_collection = db["payment_candidates"]
+
 
 def get_analyzed_documents():
     response = workflow_collection.find()
@@ -24,3 +29,82 @@ def get_analyzed_documents():
         
     return documents
 
+
+def ensure_payment_candidate_indexes():
+    payment_candidates_collection.create_index([("document_id", ASCENDING)], unique=True)
+    payment_candidates_collection.create_index([("phone_number", ASCENDING)])
+    payment_candidates_collection.create_index([("paybill", ASCENDING)])
+    payment_candidates_collection.create_index([("till", ASCENDING)])
+    payment_candidates_collection.create_index([("extracted_at", DESCENDING)])
+    workflow_collection.create_index([("payment_extracted", ASCENDING)])
+
+
+# The destination stores one record per element, elements of a file share a record_id
+DOCUMENT_KEY = {"$ifNull": ["$record_id", "$metadata.filename", {"$toString": "$_id"}]}
+
+
+def get_unextracted_document_ids(batch_size: int):
+    response = workflow_collection.aggregate(
+        [
+            {"$match": {"payment_extracted": {"$ne": True}}},
+            {"$group": {"_id": DOCUMENT_KEY}},
+            {"$sort": {"_id": ASCENDING}},
+            {"$limit": batch_size},
+        ]
+    )
+
+    return [doc["_id"] for doc in response]
+
+
+def get_document_elements(document_ids):
+    element_ids = [
+        ObjectId(document_id) for document_id in document_ids if ObjectId.is_valid(document_id)
+    ]
+    response = workflow_collection.find(
+        {
+            "$or": [
+                {"record_id": {"$in": document_ids}},
+                {"record_id": None, "metadata.filename": {"$in": document_ids}},
+                {"record_id": None, "metadata.filename": None, "_id": {"$in": element_ids}},
+            ]
+        },
+        {"text": 1, "record_id": 1, "metadata.filename": 1, "metadata.entities": 1},
+    ).sort("_id", ASCENDING)
+
+    return list(response)
+
+
+def save_payment_candidates(candidates, document_ids, element_ids):
+    extracted_at = datetime.now(timezone.utc)
+    if candidates:
+        payment_candidates_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"document_id": candidate["document_id"]},
+                    {"$set": {**candidate, "extracted_at": extracted_at}},
+                    upsert=True,
+                )
+                for candidate in candidates
+            ]
+        )
+
+    # Remove earlier candidates of documents that no longer yield any payment fields
+    stored_ids = {candidate["document_id"] for candidate in candidates}
+    stale_ids = [document_id for document_id in document_ids if document_id not in stored_ids]
+    if stale_ids:
+        payment_candidates_collection.delete_many({"document_id": {"$in": stale_ids}})
+
+    # Mark the elements read as processed so later runs only handle unseen documents
+    workflow_collection.update_many(
+        {"_id": {"$in": element_ids}}, {"$set": {"payment_extracted": True}}
+    )
+
+
+def get_payment_candidates(limit: int):
+    response = (
+        payment_candidates_collection.find({}, {"_id": 0})
+        .sort([("extracted_at", DESCENDING), ("document_id", ASCENDING)])
+        .limit(limit)
+    )
+
+    return list(response)
@@ -0,0 +1,239 @@
+import os
+import re
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from database.database import (
+    ensure_payment_candidate_indexes,
+    get_document_elements,
+    get_unextracted_document_ids,
+    save_payment_candidates,
+)
+
+AMOUNT = r"(\d[\d,]*(?:\.\d{1,2})?)"
+CURRENCY = r"(?:\b(?:KES|KSHS|KSH)(?![A-Z])\.?\s*)"
+LABEL_END = rf"\s*[:\-]?\s*{CURRENCY}?{AMOUNT}"
+
+#Labelled amounts in order of preference, a final amount due beats a plain total
+AMOUNT_DUE_PATTERN = re.compile(
+    rf"(?:\b(?:amount|balance|total)\s+(?:due|payable)\b|\bgrand\s+total\b){LABEL_END}",
+    re.IGNORECASE,
+)
+TOTAL_PATTERN = re.compile(rf"(?<!sub )(?<!sub-)\btotal\b{LABEL_END}", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(rf"\bamount\b{LABEL_END}", re.IGNORECASE)
+CURRENCY_AMOUNT_PATTERN = re.compile(rf"{CURRENCY}{AMOUNT}", re.IGNORECASE)
+
+PHONE_PATTERN = re.compile(r"(?<!\d)(?:\+?254|0)\s?([17]\d{2})\s?(\d{3})\s?(\d{3})(?!\d)")
+NUMBER_LABEL = r"(?:\s*(?:no|number)\b\.?|\s*#)?\s*[:\-#]?\s*"
+PAYBILL_PATTERN = re.compile(
+    rf"\bpay\s*bill\b{NUMBER_LABEL}(\d{{5,7}})\b", re.IGNORECASE
+)
+TILL_PATTERN = re.compile(
+    rf"\b(?:till|buy\s*goods)\b{NUMBER_LABEL}(\d{{5,7}})\b", re.IGNORECASE
+)
+#References must contain a digit so words following a label are not picked up
+REFERENCE_PATTERN = re.compile(
+    rf"\b(?:account|acc|invoice|reference|ref)\b\.?{NUMBER_LABEL}((?=[A-Z\-/]*\d)[A-Z0-9][A-Z0-9\-/]*)",
+    re.IGNORECASE,
+)
+DUE_DATE_PATTERN = re.compile(
+    r"\bdue\b(?:\s*(?:date|on|by)\b)?\s*[:\-]?\s*(\d{4}-\d{2}-\d{2}|\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}|\d{1,2}\s+[A-Za-z]+\s+\d{4})",
+    re.IGNORECASE,
+)
+
+# Process pool used for CPU-heavy parsing
+_extraction_pool: ProcessPoolExecutor | None = None
+
+
+def parse_amount(value: str):
+    """Convert an amount string such as '1,250.00' to a number"""
+    try:
+        amount = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    return int(amount) if amount.is_integer() else amount
+
+
+def find_amount(text: str):
+    """Find the payable amount, preferring amount due, then the last total, then any amount"""
+
+    match = AMOUNT_DUE_PATTERN.search(text)
+    if match is None:
+        #Totals are usually repeated down an invoice, the final one is payable
+        totals = list(TOTAL_PATTERN.finditer(text))
+        match = totals[-1] if totals else None
+    match = match or AMOUNT_PATTERN.search(text) or CURRENCY_AMOUNT_PATTERN.search(text)
+    return parse_amount(match.group(1)) if match else None
+
+
+def entity_items(entities):
+    """Get the list of NER entities, which the NER node stores as a list or under an "items" key"""
+    if isinstance(entities, dict):
+        entities = entities.get("items", [])
+    return [entity for entity in entities or [] if isinstance(entity, dict)]
+
+
+def entity_values(entities, *entity_types: str):
+    """Get the values of NER entities of the given types"""
+    return [
+        entity.get("entity")
+        for entity in entity_items(entities)
+        if str(entity.get("type", "")).upper() in entity_types and entity.get("entity")
+    ]
+
+
+def document_key(element: dict) -> str:
+    """Identify the document an element belongs to, matching DOCUMENT_KEY in the database"""
+    filename = (element.get("metadata") or {}).get("filename")
+    if element.get("record_id") is not None:
+        return element["record_id"]
+    if filename is not None:
+        return filename
+    return str(element["_id"])
+
+
+def join_document_elements(elements: list[dict]):
+    """Join the text and NER entities of the elements of one document"""
+    text = "\n".join(element.get("text") or "" for element in elements)
+    entities = [
+        entity
+        for element in elements
+        for entity in entity_items((element.get("metadata") or {}).get("entities"))
+    ]
+    return text, entities
+
+
+def extract_payment_fields(text: str, entities) -> dict:
+    """
+    Extract payment-relevant fields from document text and its NER entities.
+
+    Args:
+        text (str): The document text.
+        entities: The NER entities produced by the workflow for this document.
+
+    Returns:
+        dict: amount, phone_number, paybill, till, reference, due_date and merchant,
+        None where not found, and dates, the unlabelled NER dates
+    """
+    text = text or ""
+
+    amount = find_amount(text)
+    if amount is None:
+        for value in entity_values(entities, "MONEY", "AMOUNT"):
+            match = re.search(AMOUNT, value)
+            if match and (amount := parse_amount(match.group(1))) is not None:
+                break
+
+    #Normalize phone numbers to the 2547XXXXXXXX format used by STK push
+    phone_match = PHONE_PATTERN.search(text)
+    phone_number = f"254{''.join(phone_match.groups())}" if phone_match else None
+
+    paybill_match = PAYBILL_PATTERN.search(text)
+    till_match = TILL_PATTERN.search(text)
+    reference_match = REFERENCE_PATTERN.search(text)
+
+    #Only a labelled date is a due date, NER dates are usually issue dates
+    due_date_match = DUE_DATE_PATTERN.search(text)
+
+    merchant = next(iter(entity_values(entities, "ORGANIZATION", "ORG")), None)
+
+    return {
+        "amount": amount,
+        "phone_number": phone_number,
+        "paybill": paybill_match.group(1) if paybill_match else None,
+        "till": till_match.group(1) if till_match else None,
+        "reference": reference_match.group(1) if reference_match else None,
+        "due_date": due_date_match.group(1) if due_date_match else None,
+        "dates": entity_values(entities, "DATE"),
+        "merchant": merchant,
+    }
+
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    """Create the extraction pool on first use"""
+    global _extraction_pool
+    if _extraction_pool is None:
+        max_workers = int(os.getenv("EXTRACTION_WORKERS", "2"))
+        _extraction_pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    """Shut down the extraction pool if it was started"""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+
+async def extract_payment_candidates(batch_size: int = 100):
+    """
+    Extract payment candidates from analyzed documents that have not been processed yet.
+
+    The destination stores one record per element, so elements are grouped
+    into documents by record_id (or filename) and each document with unseen
+    elements is extracted from all of its text. Documents are parsed in
+    batches in the extraction pool and written to the payment_candidates
+    collection, keyed by document. Documents without an amount or a payment
+    destination are marked as processed, and a candidate stored for them by
+    an earlier run is removed.
+
+    Args:
+        batch_size (int): Number of documents to parse per batch.
+
+    Returns:
+        dict: Number of documents processed and candidates stored
+    """
+    await asyncio.to_thread(ensure_payment_candidate_indexes)
+    loop = asyncio.get_running_loop()
+    pool = _get_extraction_pool()
+
+    processed = 0
+    stored = 0
+    while True:
+        document_ids = await asyncio.to_thread(get_unextracted_document_ids, batch_size)
+        if not document_ids:
+            break
+
+        elements = await asyncio.to_thread(get_document_elements, document_ids)
+        if not elements:
+            break
+
+        documents = {}
+        for element in elements:
+            documents.setdefault(document_key(element), []).append(element)
+
+        #Parse the batch in the process pool
+        fields = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, extract_payment_fields, *join_document_elements(document_elements)
+                )
+                for document_elements in documents.values()
+            )
+        )
+
+        candidates = [
+            {
+                "document_id": document_id,
+                "filename": (document_elements[0].get("metadata") or {}).get("filename"),
+                **document_fields,
+            }
+            for (document_id, document_elements), document_fields in zip(
+                documents.items(), fields
+            )
+            if document_fields["amount"] is not None
+            or document_fields["paybill"]
+            or document_fields["till"]
+            or document_fields["phone_number"]
+        ]
+
+        await asyncio.to_thread(
+            save_payment_candidates,
+            candidates,
+            list(documents),
+            [element["_id"] for element in elements],
+        )
+        processed += len(documents)
+        stored += len(candidates)
+
+    return {"documents_processed": processed, "candidates_stored": stored}
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+
+NER_PROMPT = "Please identify and classify named entities in the following text. Focus on identifying organizations, people, locations, dates, and other relevant entities. Provide the entities and their corresponding types as a structured JSON response.\n\n[START OF TEXT]"
+
+PARTITION_STRATEGIES = {"fast", "hi_res", "auto", "ocr_only"}
+
+DEFAULT_PROFILE = "full-ocr-ner"
+
+#Built-in profiles, can be overridden or extended from PIPELINE_PROFILES_PATH
+DEFAULT_PROFILES = {
+    "fast-text": {
+        "partitioner": {
+            "strategy": "fast",
+            "include_page_breaks": True,
+            "xml_keep_tags": True,
+            "encoding": "utf-8",
+        },
+        "ner_prompt": None,
+    },
+    "fast-text-ner": {
+        "partitioner": {
+            "strategy": "fast",
+            "include_page_breaks": True,
+            "xml_keep_tags": True,
+            "encoding": "utf-8",
+        },
+        "ner_prompt": NER_PROMPT,
+    },
+    "tables": {
+        "partitioner": {
+            "strategy": "hi_res",
+            "include_page_breaks": True,
+            "pdf_infer_table_structure": True,
+            "encoding": "utf-8",
+            "ocr_languages": ["eng"],
+            "extract_image_block_types": ["table"],
+            "infer_table_structure": True,
+        },
+        "ner_prompt": None,
+    },
+    "full-ocr-ner": {
+        "partitioner": {
+            "strategy": "hi_res",
+            "include_page_breaks": True,
+            "pdf_infer_table_structure": True,
+            "xml_keep_tags": True,
+            "encoding": "utf-8",
+            "ocr_languages": ["eng", "fra"],
+            "extract_image_block_types": ["image", "table"],
+            "infer_table_structure": True,
+        },
+        "ner_prompt": NER_PROMPT,
+    },
+}
+
+
+def validate_profile(name: str, profile: dict):
+    """
+    Validate a pipeline profile definition.
+
+    Args:
+        name (str): The profile name.
+        profile (dict): The profile definition.
+
+    Raises:
+        ValueError: If the profile is malformed
+    """
+    if not isinstance(profile, dict):
+        raise ValueError(f"Pipeline profile '{name}' must be an object")
+
+    partitioner = profile.get("partitioner")
+    if not isinstance(partitioner, dict):
+        raise ValueError(f"Pipeline profile '{name}' is missing partitioner settings")
+
+    if partitioner.get("strategy") not in PARTITION_STRATEGIES:
+        raise ValueError(
+            f"Pipeline profile '{name}' has an invalid strategy: {partitioner.get('strategy')}"
+        )
+
+    ner_prompt = profile.get("ner_prompt")
+    if ner_prompt is not None and not isinstance(ner_prompt, str):
+        raise ValueError(f"Pipeline profile '{name}' ner_prompt must be a string or null")
+
+
+def load_pipeline_profiles(path: str | None = None):
+    """
+    Load and validate pipeline profiles.
+
+    Profiles from the JSON file at path (or PIPELINE_PROFILES_PATH) are merged
+    over the built-in profiles.
+
+    Args:
+        path (str | None): Path to a JSON file mapping profile names to definitions.
+
+    Returns:
+        dict: Validated profiles keyed by name
+    """
+    profiles = dict(DEFAULT_PROFILES)
+
+    path = path or os.getenv("PIPELINE_PROFILES_PATH")
+    if path:
+        with open(path) as f:
+            profiles.update(json.load(f))
+
+    for name, profile in profiles.items():
+        validate_profile(name, profile)
+
+    return profiles
+
+
+def profile_fingerprint(profile: dict, *parts: str):
+    """
+    Fingerprint a profile definition together with any extra identifiers.
+
+    Args:
+        profile (dict): The profile definition.
+        parts (str): Extra identifiers, e.g. source and destination ids.
+
+    Returns:
+        str: Hex digest identifying the definition
+    """
+    payload = json.dumps([profile, *parts], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
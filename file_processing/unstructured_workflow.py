@@ -1,13 +1,21 @@
 import os
+import time
 import asyncio
-from dotenv import load_dotenv
+import hashlib
+from urllib.parse import urlparse
+import boto3
+import httpx
 from unstructured_client import UnstructuredClient
+from unstructured_client.utils import BackoffStrategy, RetryConfig
 from unstructured_client.models.operations import (
     CreateDestinationRequest,
     CreateSourceRequest,
     CreateWorkflowRequest,
     RunWorkflowRequest,
     GetWorkflowRequest,
+    ListJobsRequest,
+    ListSourcesRequest,
+    ListWorkflowsRequest,
 )
 from unstructured_client.models.shared import (
     SourceConnectorType,
@@ -21,16 +29,151 @@ from unstructured_client.models.shared import (
     WorkflowNode,
     WorkflowNodeType,
 )
+from file_processing.pipeline_profiles import (
+    DEFAULT_PROFILE,
+    load_pipeline_profiles,
+    profile_fingerprint,
+)
+
+#Job statuses after which a workflow run has stopped processing
+FINISHED_JOB_STATUSES = {"COMPLETED", "FAILED", "STOPPED"}
+
+#File types that carry plain text and do not need OCR
+FAST_PARTITION_EXTENSIONS = {".txt", ".md", ".csv", ".tsv", ".html", ".htm", ".xml", ".json", ".eml"}
+
+
+def split_prefix(keys: list[str], prefix: str):
+    """Split the keys under a prefix into one recursive shard per subfolder and one non-recursive shard for its direct files"""
+
+    folders = {}
+    files = []
+    for key in keys:
+        relative_key = key[len(prefix):]
+        if "/" in relative_key:
+            folder = prefix + relative_key.split("/", 1)[0] + "/"
+            folders.setdefault(folder, []).append(key)
+        else:
+            files.append(key)
+
+    shards = [
+        {"prefix": folder, "recursive": True, "keys": folder_keys}
+        for folder, folder_keys in sorted(folders.items())
+    ]
+
+    #Direct files get a non-recursive shard so subfolders are not processed twice
+    if files:
+        shards.append({"prefix": prefix, "recursive": False, "keys": files})
+    return shards
+
+
+def expand_shard(shard: dict):
+    """Split a shard into smaller shards, or return it unchanged if it cannot be split"""
+
+    if shard["recursive"]:
+        shards = split_prefix(shard["keys"], shard["prefix"])
+        #Descend through folders that only contain a single subfolder
+        if len(shards) == 1 and shards[0]["recursive"]:
+            return expand_shard(shards[0])
+        return shards
+
+    #A set of files at one level splits into one shard per file
+    if len(shard["keys"]) > 1:
+        return [{"prefix": key, "recursive": False, "keys": [key]} for key in shard["keys"]]
+    return [shard]
+
+
+def plan_shards(keys: list[str], base_prefix: str, max_shards: int):
+    """
+    Plan prefix shards for the keys under base_prefix.
+
+    Starts with one shard per top level folder plus one for the files at the
+    root, then repeatedly splits the largest shard until max_shards is reached
+    or nothing can be split without exceeding it. A source with more top level
+    folders than max_shards keeps one shard per folder.
+
+    Shards map to S3 connectors, which select files by folder, so files at
+    one level cannot be grouped: they are either one shard or one shard per
+    file. A flat source with more files than max_shards stays a single shard.
+    """
+
+    shards = split_prefix(keys, base_prefix)
+    while len(shards) < max_shards:
+        candidates = []
+        for index, shard in enumerate(shards):
+            expansion = expand_shard(shard)
+            if len(expansion) > 1 and len(shards) - 1 + len(expansion) <= max_shards:
+                candidates.append((len(shard["keys"]), index, expansion))
+        if not candidates:
+            break
+
+        _, index, expansion = max(candidates, key=lambda candidate: candidate[:2])
+        shards[index:index + 1] = expansion
 
-#Load environment variables
-load_dotenv(override=True)
+    return shards
+
+
+class UnstructuredHTTPClient(httpx.AsyncClient):
+    """
+    Async HTTP client that applies its own timeouts to SDK requests.
+
+    The SDK builds every request with timeout=None when no timeout_ms is set,
+    which disables all httpx timeouts. Falling back to the client timeout
+    keeps the separate connect and read limits instead.
+    """
+
+    def build_request(self, *args, timeout=httpx.USE_CLIENT_DEFAULT, **kwargs):
+        if timeout is None:
+            timeout = httpx.USE_CLIENT_DEFAULT
+        return super().build_request(*args, timeout=timeout, **kwargs)
+
+
+def create_unstructured_http_client(transport: httpx.AsyncBaseTransport | None = None):
+    """Create the pooled async HTTP client used for Unstructured API calls"""
+
+    timeout = httpx.Timeout(
+        float(os.getenv("UNSTRUCTURED_READ_TIMEOUT", "60")),
+        connect=float(os.getenv("UNSTRUCTURED_CONNECT_TIMEOUT", "10")),
+    )
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("UNSTRUCTURED_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("UNSTRUCTURED_MAX_KEEPALIVE", "10")),
+    )
+    return UnstructuredHTTPClient(timeout=timeout, limits=limits, transport=transport)
 
 
 class UnstructuredPipeline:
-    def __init__(self):
-        """Initialize UnstructuredClient and environment variables"""
-        self.client = UnstructuredClient(api_key_auth=os.getenv("UNSTRUCTURED_API_KEY"))
-        
+    def __init__(self, http_client: httpx.AsyncClient):
+        """Initialize UnstructuredClient on the injected HTTP client and environment variables"""
+
+        #Retry transient failures with backoff, bounded by a total time budget
+        retry_config = RetryConfig(
+            "backoff",
+            BackoffStrategy(
+                initial_interval=500,
+                max_interval=5000,
+                exponent=2.0,
+                max_elapsed_time=int(os.getenv("UNSTRUCTURED_RETRY_MAX_ELAPSED_MS", "30000")),
+            ),
+            retry_connection_errors=True,
+        )
+
+        self.client = UnstructuredClient(
+            api_key_auth=os.getenv("UNSTRUCTURED_API_KEY"),
+            async_client=http_client,
+            retry_config=retry_config,
+        )
+
+        # Limit concurrent calls per Unstructured API and record their latency
+        max_concurrency = int(os.getenv("UNSTRUCTURED_API_CONCURRENCY", "4"))
+        self.api_limits = {
+            api: asyncio.Semaphore(max_concurrency)
+            for api in ("sources", "destinations", "workflows", "jobs")
+        }
+        self.call_latencies = {}
+
+        # Operations ignore the client server_url, so it is passed on every call
+        self.server_url = os.getenv("UNSTRUCTURED_API_URL")
+
         # Load environment variables once
         self.aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
         self.aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -41,11 +184,62 @@ class UnstructuredPipeline:
         self.collection_name = os.getenv("COLLECTION_NAME")
         self.mongodb_uri = os.getenv("MONGODB_URI")
         self.s3_remote_url = os.getenv("S3_REMOTE_URL")
-        
+
+        # Pipeline profiles are validated once
+        self.profiles = load_pipeline_profiles()
+
+        # Shard progress of sharded jobs started by this process, and their background tasks
+        self.sharded_jobs = {}
+        self.sharded_tasks = {}
 
 
-    async def create_source_connector(self,connector_name: str):
-        """Create an s3 source connector"""
+    async def call_api(self, api: str, operation, idempotent: bool = True, **kwargs):
+        """Call an Unstructured API operation within its concurrency limit and record its latency"""
+
+        #A retried create or run can duplicate connectors, workflows or jobs
+        if not idempotent:
+            kwargs["retries"] = None
+
+        if self.server_url:
+            kwargs["server_url"] = self.server_url
+
+        async with self.api_limits[api]:
+            started = time.perf_counter()
+            try:
+                return await operation(**kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                stats = self.call_latencies.setdefault(
+                    f"{api}.{operation.__name__}",
+                    {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+                )
+                stats["calls"] += 1
+                stats["total_seconds"] += elapsed
+                stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+
+
+    def get_call_latencies(self):
+        """Summarise recorded Unstructured API latencies per operation"""
+
+        return {
+            name: {
+                "calls": stats["calls"],
+                "avg_seconds": round(stats["total_seconds"] / stats["calls"], 3),
+                "max_seconds": round(stats["max_seconds"], 3),
+            }
+            for name, stats in self.call_latencies.items()
+        }
+
+
+
+    async def create_source_connector(
+        self,
+        connector_name: str,
+        remote_url: str | None = None,
+        recursive: bool = True,
+    ):
+        """Create an s3 source connector, optionally scoped to a prefix of the bucket"""
       
         #Create source connector
         source_connector = CreateSourceConnector(
@@ -54,14 +248,17 @@ class UnstructuredPipeline:
             config=S3SourceConnectorConfigInput(
                 key=self.aws_access_key,
                 secret=self.aws_secret_key,
-                remote_url=self.s3_remote_url,
+                remote_url=remote_url or self.s3_remote_url,
                 endpoint_url=self.aws_s3_endpoint,
-                recursive=True,
+                recursive=recursive,
             ),
         )
 
         #Create source connector
-        response = await self.client.sources.create_source_async(
+        response = await self.call_api(
+            "sources",
+            self.client.sources.create_source_async,
+            idempotent=False,
             request=CreateSourceRequest(create_source_connector=source_connector)
         )
 
@@ -86,7 +283,10 @@ class UnstructuredPipeline:
         )
 
         #Create destination connector
-        response = await self.client.destinations.create_destination_async(
+        response = await self.call_api(
+            "destinations",
+            self.client.destinations.create_destination_async,
+            idempotent=False,
             request=CreateDestinationRequest(
                 create_destination_connector=destination_connector
             )
@@ -101,40 +301,48 @@ class UnstructuredPipeline:
         self,
         workflow_name: str,
         source_id: str,
-        destination_id: str
+        destination_id: str,
+        profile: str = DEFAULT_PROFILE,
     ):
-        """Create a custom workflow"""
-
-        #Create high resolution partitioner workflow node
-        high_res_paritioner_workflow_node = WorkflowNode(
-            name="Partitioner",
-            subtype="unstructured_api",
-            type=WorkflowNodeType.PARTITION,
-            settings={
-                "strategy": "hi_res",
-                "include_page_breaks": True,
-                "pdf_infer_table_structure": True,
-                "xml_keep_tags": True,
-                "encoding": "utf-8",
-                "ocr_languages": ["eng", "fra"],
-                "extract_image_block_types": ["image", "table"],
-                "infer_table_structure": True,
-            },
-        )
+        """Create a custom workflow from a pipeline profile, reusing an identical one if it exists"""
+
+        if profile not in self.profiles:
+            raise ValueError(f"Unknown pipeline profile: {profile}")
+        profile_definition = self.profiles[profile]
+
+        #The fingerprint in the name identifies workflows with an identical definition
+        fingerprint = profile_fingerprint(profile_definition, source_id, destination_id)
+        workflow_name = f"{workflow_name}-{fingerprint[:12]}"
+
+        #Reuse the workflow with the same name, source and destination
+        existing = await self.find_workflow(workflow_name, source_id, destination_id)
+        if existing is not None:
+            return existing
+
+        #Create partitioner workflow node
+        workflow_nodes = [
+            WorkflowNode(
+                name="Partitioner",
+                subtype="unstructured_api",
+                type=WorkflowNodeType.PARTITION,
+                settings=profile_definition["partitioner"],
+            )
+        ]
 
         #Create ner enrichment workflow node
-        ner_enrichment_workflow_node = WorkflowNode(
-            name="NER Enrichment",
-            subtype="openai_ner",
-            type=WorkflowNodeType.PROMPTER,
-            settings={
-                "prompt_interface_overrides": {
-                    "prompt": {
-                        "user": "Please identify and classify named entities in the following text. Focus on identifying organizations, people, locations, dates, and other relevant entities. Provide the entities and their corresponding types as a structured JSON response.\n\n[START OF TEXT]"
-                    }
-                }
-            },
-        )
+        if profile_definition.get("ner_prompt"):
+            workflow_nodes.append(
+                WorkflowNode(
+                    name="NER Enrichment",
+                    subtype="openai_ner",
+                    type=WorkflowNodeType.PROMPTER,
+                    settings={
+                        "prompt_interface_overrides": {
+                            "prompt": {"user": profile_definition["ner_prompt"]}
+                        }
+                    },
+                )
+            )
 
         #Create workflow
         workflow = CreateWorkflow(
@@ -142,14 +350,14 @@ class UnstructuredPipeline:
             source_id=source_id,
             destination_id=destination_id,
             workflow_type=WorkflowType.CUSTOM,
-            workflow_nodes=[
-                high_res_paritioner_workflow_node,
-                ner_enrichment_workflow_node,
-            ],
+            workflow_nodes=workflow_nodes,
         )
 
         #Create workflow
-        response = await self.client.workflows.create_workflow_async(
+        response = await self.call_api(
+            "workflows",
+            self.client.workflows.create_workflow_async,
+            idempotent=False,
             request=CreateWorkflowRequest(create_workflow=workflow)
         )
 
@@ -158,11 +366,30 @@ class UnstructuredPipeline:
 
 
 
+    async def find_workflow(self, workflow_name: str, source_id: str, destination_id: str):
+        """Find a workflow by name between a source and a destination"""
+
+        #List workflows of the source and destination
+        response = await self.call_api(
+            "workflows",
+            self.client.workflows.list_workflows_async,
+            request=ListWorkflowsRequest(source_id=source_id, destination_id=destination_id),
+        )
+
+        #Return the first workflow with the name, if any
+        workflows = response.response_list_workflows or []
+        return next((workflow for workflow in workflows if workflow.name == workflow_name), None)
+
+
+
     async def run_workflow_unstructured(self,workflow_id: str):
         """Run a workflow"""
 
         #Run workflow
-        response = await self.client.workflows.run_workflow_async(
+        response = await self.call_api(
+            "workflows",
+            self.client.workflows.run_workflow_async,
+            idempotent=False,
             request=RunWorkflowRequest(workflow_id=workflow_id)
         )
 
@@ -174,7 +401,9 @@ class UnstructuredPipeline:
         """Get a workflow"""
 
         #Get workflow
-        response = await self.client.workflows.get_workflow_async(
+        response = await self.call_api(
+            "workflows",
+            self.client.workflows.get_workflow_async,
             request=GetWorkflowRequest(
                 workflow_id=workflow_id
             )
@@ -182,3 +411,276 @@ class UnstructuredPipeline:
 
         #Return workflow information
         return response.workflow_information
+
+
+
+    async def get_latest_job(self, workflow_id: str):
+        """Get the most recently created job of a workflow"""
+
+        #List jobs
+        response = await self.call_api(
+            "jobs",
+            self.client.jobs.list_jobs_async,
+            request=ListJobsRequest(workflow_id=workflow_id),
+        )
+
+        #Return the newest job, if any
+        jobs = response.response_list_jobs or []
+        return max(jobs, key=lambda job: job.created_at, default=None)
+
+
+
+    async def wait_for_job(
+        self,
+        workflow_id: str,
+        previous_job_id: str | None,
+        poll_interval: float,
+        timeout: float,
+    ):
+        """Poll the newest job of a workflow until it finishes and return its status, or TIMEOUT"""
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = await self.get_latest_job(workflow_id)
+            #Ignore jobs from before this run started
+            if (
+                job is not None
+                and job.id != previous_job_id
+                and job.status in FINISHED_JOB_STATUSES
+            ):
+                return job.status
+            await asyncio.sleep(poll_interval)
+
+        return "TIMEOUT"
+
+
+
+    async def find_source_connector(self, connector_name: str):
+        """Find an s3 source connector by name"""
+
+        #List source connectors
+        response = await self.call_api(
+            "sources",
+            self.client.sources.list_sources_async,
+            request=ListSourcesRequest(source_type=SourceConnectorType.S3),
+        )
+
+        #Return the first connector with the name, if any
+        sources = response.response_list_sources or []
+        return next((source for source in sources if source.name == connector_name), None)
+
+
+
+    async def find_workflows(self, name_prefix: str):
+        """Find workflows whose name starts with a prefix"""
+
+        #List workflows
+        response = await self.call_api(
+            "workflows",
+            self.client.workflows.list_workflows_async,
+            request=ListWorkflowsRequest(),
+        )
+
+        #Return the matching workflows
+        workflows = response.response_list_workflows or []
+        return [workflow for workflow in workflows if workflow.name.startswith(name_prefix)]
+
+
+
+    def list_shards(self, max_shards: int):
+        """Plan prefix shards of the s3 source with the file types they contain"""
+
+        #Split the remote url into bucket and base prefix
+        parsed = urlparse(self.s3_remote_url)
+        bucket = parsed.netloc
+        base_prefix = parsed.path.lstrip("/")
+        if base_prefix and not base_prefix.endswith("/"):
+            base_prefix += "/"
+
+        s3 = boto3.client(
+            "s3",
+            aws_access_key_id=self.aws_access_key,
+            aws_secret_access_key=self.aws_secret_key,
+            endpoint_url=self.aws_s3_endpoint,
+        )
+
+        #List every object key below the base prefix
+        keys = []
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=base_prefix):
+            for obj in page.get("Contents", []):
+                if not obj["Key"].endswith("/"):
+                    keys.append(obj["Key"])
+
+        return [
+            {
+                "url": f"s3://{bucket}/{shard['prefix']}",
+                "recursive": shard["recursive"],
+                "extensions": {os.path.splitext(key)[1].lower() for key in shard["keys"]},
+            }
+            for shard in plan_shards(keys, base_prefix, max_shards)
+        ]
+
+
+
+    def partition_profile(self, extensions: set[str]):
+        """Pick the cheapest pipeline profile that handles every file type in a shard, keeping NER enrichment"""
+
+        if extensions and extensions <= FAST_PARTITION_EXTENSIONS:
+            return "fast-text-ner"
+        return DEFAULT_PROFILE
+
+
+
+    def shard_name(self, job_name: str, shard_url: str, recursive: bool):
+        """Deterministic name of a shard's connector, so it is found again after a restart"""
+
+        digest = hashlib.sha256(f"{shard_url}|{recursive}".encode()).hexdigest()[:12]
+        return f"{job_name}-shard-{digest}"
+
+
+
+    async def get_or_create_shard_workflow(
+        self,
+        job_name: str,
+        shard_url: str,
+        recursive: bool,
+        profile: str,
+        destination_id: str,
+    ):
+        """Find the workflow for a shard by name or create one with its own source connector"""
+
+        shard_name = self.shard_name(job_name, shard_url, recursive)
+
+        source = await self.find_source_connector(shard_name)
+        if source is None:
+            source = await self.create_source_connector(
+                shard_name, remote_url=shard_url, recursive=recursive
+            )
+
+        workflow = await self.create_workflow_unstructured(
+            f"{shard_name}-{profile}", source.id, destination_id, profile=profile
+        )
+        return workflow.id
+
+
+
+    async def run_shard(
+        self,
+        job_name: str,
+        shard: dict,
+        destination_id: str,
+        semaphore: asyncio.Semaphore,
+        poll_interval: float,
+        timeout: float,
+    ):
+        """Run one shard's workflow, holding a concurrency slot until its job finishes"""
+
+        async with semaphore:
+            try:
+                shard["workflow_id"] = await self.get_or_create_shard_workflow(
+                    job_name,
+                    shard["shard"],
+                    shard["recursive"],
+                    shard["profile"],
+                    destination_id,
+                )
+                previous_job = await self.get_latest_job(shard["workflow_id"])
+                await self.run_workflow_unstructured(shard["workflow_id"])
+                shard["status"] = "RUNNING"
+
+                shard["status"] = await self.wait_for_job(
+                    shard["workflow_id"],
+                    previous_job.id if previous_job else None,
+                    poll_interval,
+                    timeout,
+                )
+            except Exception as e:
+                shard["status"] = "FAILED"
+                shard["error"] = str(e)
+
+
+
+    async def run_sharded_workflow(
+        self,
+        job_name: str,
+        destination_id: str,
+        max_concurrency: int = 4,
+        max_shards: int = 8,
+        poll_interval: float = 10.0,
+        timeout: float = 6 * 3600,
+    ):
+        """
+        Split the s3 source into prefix shards and process them in the background,
+        at most max_concurrency shard jobs at a time
+        """
+
+        if job_name in self.sharded_tasks and not self.sharded_tasks[job_name].done():
+            raise ValueError(f"Sharded job {job_name} is already running")
+
+        shards = [
+            {
+                "shard": shard["url"],
+                "recursive": shard["recursive"],
+                "profile": self.partition_profile(shard["extensions"]),
+                "status": "QUEUED",
+            }
+            for shard in await asyncio.to_thread(self.list_shards, max_shards)
+        ]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        #Run shards in the background, each holds a slot until its job finishes
+        self.sharded_jobs[job_name] = shards
+        self.sharded_tasks[job_name] = asyncio.gather(
+            *(
+                self.run_shard(
+                    job_name, shard, destination_id, semaphore, poll_interval, timeout
+                )
+                for shard in shards
+            )
+        )
+        return shards
+
+
+
+    async def get_sharded_workflow_status(self, job_name: str):
+        """Combine the status of the latest job of every shard workflow in a sharded job"""
+
+        if job_name in self.sharded_jobs:
+            shards = [dict(shard) for shard in self.sharded_jobs[job_name]]
+        else:
+            #After a restart, find the shard workflows by their deterministic names
+            workflows = await self.find_workflows(f"{job_name}-shard-")
+            if not workflows:
+                raise ValueError(f"Unknown sharded job: {job_name}")
+            shards = [
+                {"workflow_id": workflow.id, "workflow_name": workflow.name}
+                for workflow in workflows
+            ]
+
+        for shard in shards:
+            if shard.get("status") in ("QUEUED", "FAILED") or "workflow_id" not in shard:
+                continue
+            #Workflow status is only active/inactive, job status carries the progress
+            job = await self.get_latest_job(shard["workflow_id"])
+            if job is None:
+                shard["status"] = "NOT_STARTED"
+            else:
+                shard["job_id"] = job.id
+                shard["status"] = job.status
+
+        #Summarise shard statuses into counts for the whole job
+        summary = {}
+        for shard in shards:
+            summary[shard["status"]] = summary.get(shard["status"], 0) + 1
+
+        return {"job_name": job_name, "summary": summary, "shards": shards}
+
+
+
+    async def shutdown(self):
+        """Cancel the background tasks of running sharded jobs"""
+
+        for task in self.sharded_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.sharded_tasks.values(), return_exceptions=True)
@@ -4,7 +4,12 @@ from collections.abc import AsyncIterator
 from mcp.server.fastmcp import FastMCP
 from daraja_endpoints.auth.generate_access_token import get_access_token
 import asyncio
-from file_processing.unstructured_workflow import UnstructuredPipeline
+from file_processing.unstructured_workflow import (
+    UnstructuredPipeline,
+    create_unstructured_http_client,
+)
+from daraja_endpoints.dynamic_qr.local_qr import shutdown_render_pool
+from file_processing.payment_extraction import shutdown_extraction_pool
 
 # Import the registration functions
 from mpesa.tools import register_mpesa_tools
@@ -47,8 +52,9 @@ async def app_lifespan(app: FastMCP) -> AsyncIterator[AppContext]:
     access_token = token_data["access_token"]
     token_expiry = int(token_data["expires_in"])
 
-    # Initialize unstructured pipeline
-    unstructured_pipeline = UnstructuredPipeline()
+    # Initialize unstructured pipeline on a pooled HTTP client
+    unstructured_http_client = create_unstructured_http_client()
+    unstructured_pipeline = UnstructuredPipeline(unstructured_http_client)
 
     context = AppContext(
         access_token=access_token,
@@ -75,6 +81,18 @@ async def app_lifespan(app: FastMCP) -> AsyncIterator[AppContext]:
             except Exception as e:
                 print(f"Error during token refresh: {e}")
 
+        # Stop the local QR render workers
+        shutdown_render_pool()
+
+        # Stop the payment extraction workers
+        shutdown_extraction_pool()
+
+        # Stop running sharded jobs before closing their HTTP client
+        await unstructured_pipeline.shutdown()
+
+        # Close the unstructured HTTP connection pool
+        await unstructured_http_client.aclose()
+
 
 # Initialize the MCP server with lifespan
 mcp = FastMCP("Daraja MCP", "1.0.0", lifespan=app_lifespan)
@@ -34,6 +34,7 @@ def register_mpesa_tools(mcp):
         amount: int,
         transaction_type: Literal["BG", "WA", "PB", "SM", "SB"],
         credit_party_identifier: str,
+        size: int = 300,
     ):
         """
         Generates a QR code for a payment request.
@@ -44,6 +45,7 @@ def register_mpesa_tools(mcp):
             amount (int): The total amount for the sale/transaction.
             transaction_type (Literal["BG", "WA", "PB", "SM", "SB"]): Transaction type.
             credit_party_identifier (str): Credit Party Identifier. Can be a Mobile Number, Business Number, Agent Till, Paybill or Business number, or Merchant Buy Goods.
+            size (int): Width and height of the QR code image in pixels.
 
         Returns:
             str: JSON formatted M-PESA API response
@@ -58,6 +60,7 @@ def register_mpesa_tools(mcp):
                 amount,
                 transaction_type,
                 credit_party_identifier,
+                str(size),
             )
             return json.dumps(response, indent=2)
         except Exception as e:
@@ -0,0 +1,146 @@
+import io
+import json
+import base64
+import asyncio
+import pytest
+from daraja_endpoints.dynamic_qr.local_qr import (
+    build_qr_payload,
+    crc16_ccitt,
+    emv_field,
+    load_qr_captures,
+    local_qr_code,
+    local_qr_transaction_types,
+    render_qr_png,
+    shutdown_render_pool,
+)
+
+CAPTURES = load_qr_captures()
+
+REQUEST = {
+    "MerchantName": "Test Shop",
+    "RefNo": "INV001",
+    "Amount": 1500,
+    "TrxCode": "BG",
+    "CPI": "123456",
+}
+
+
+def parse_emv(payload: str) -> dict:
+    fields = {}
+    while payload:
+        tag, length = payload[:2], int(payload[2:4])
+        fields[tag] = payload[4 : 4 + length]
+        payload = payload[4 + length :]
+    return fields
+
+
+def write_capture(path, payload: str):
+    (path / "capture.json").write_text(json.dumps({"request": REQUEST, "payload": payload}))
+
+
+@pytest.fixture
+def verified_bg(tmp_path, monkeypatch):
+    payload = build_qr_payload(*REQUEST.values())
+    write_capture(tmp_path, payload)
+    monkeypatch.setenv("QR_CAPTURES_PATH", str(tmp_path))
+    monkeypatch.setenv("QR_LOCAL_TRANSACTION_TYPES", "BG")
+
+
+def test_crc16_ccitt_check_value():
+    assert crc16_ccitt("123456789") == "29B1"
+
+
+def test_emv_field_encodes_length():
+    assert emv_field("54", 1500) == "54041500"
+
+
+def test_payload_fields_and_crc():
+    payload = build_qr_payload("Test Shop", "INV001", 1500, "BG", "123456")
+    fields = parse_emv(payload)
+
+    assert fields["54"] == "1500"
+    assert fields["59"] == "Test Shop"
+    assert parse_emv(fields["29"]) == {"00": "BG", "01": "123456"}
+    assert parse_emv(fields["62"]) == {"05": "INV001"}
+    assert payload.endswith("6304" + fields["63"])
+    assert fields["63"] == crc16_ccitt(payload[:-4])
+
+
+@pytest.mark.skipif(not CAPTURES, reason="no decoded Daraja QR captures")
+@pytest.mark.parametrize("capture", CAPTURES)
+def test_payload_matches_captured_daraja_qr(capture):
+    request = capture["request"]
+
+    payload = build_qr_payload(
+        request["MerchantName"],
+        request["RefNo"],
+        request["Amount"],
+        request["TrxCode"],
+        request["CPI"],
+    )
+
+    assert payload == capture["payload"]
+
+
+def test_local_mode_needs_a_capture(tmp_path, monkeypatch):
+    monkeypatch.setenv("QR_CAPTURES_PATH", str(tmp_path))
+    monkeypatch.setenv("QR_LOCAL_TRANSACTION_TYPES", "BG,PB")
+
+    assert local_qr_transaction_types() == set()
+
+
+def test_local_mode_is_disabled_by_a_mismatched_capture(tmp_path, monkeypatch):
+    write_capture(tmp_path, "000201")
+    monkeypatch.setenv("QR_CAPTURES_PATH", str(tmp_path))
+    monkeypatch.setenv("QR_LOCAL_TRANSACTION_TYPES", "BG")
+
+    assert local_qr_transaction_types() == set()
+
+
+def test_local_mode_is_enabled_by_a_matching_capture(verified_bg):
+    assert local_qr_transaction_types() == {"BG"}
+
+
+def test_local_qr_code_refuses_unverified_types(tmp_path, monkeypatch):
+    monkeypatch.setenv("QR_CAPTURES_PATH", str(tmp_path))
+
+    with pytest.raises(ValueError, match="not been verified"):
+        asyncio.run(local_qr_code("Test Shop", "INV001", 1500, "BG", "123456"))
+
+
+@pytest.mark.parametrize("size", ["0", "99", "1001"])
+def test_local_qr_code_rejects_out_of_range_sizes(verified_bg, size):
+    with pytest.raises(ValueError, match="between"):
+        asyncio.run(local_qr_code("Test Shop", "INV001", 1500, "BG", "123456", size))
+
+
+@pytest.mark.parametrize("size", [100, 301, 1000])
+def test_render_qr_png_uses_whole_modules(size):
+    pytest.importorskip("qrcode")
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(base64.b64decode(render_qr_png("payload", size))))
+
+    assert image.size == (size, size)
+    # The top edge of the top-left finder pattern is 7 modules wide
+    x0, y0 = next(
+        (x, y) for y in range(size) for x in range(size) if not image.getpixel((x, y))
+    )
+    finder_width = next(x for x in range(x0, size) if image.getpixel((x, y0))) - x0
+    assert finder_width >= 7
+    assert finder_width % 7 == 0
+
+
+def test_local_qr_code_renders_verified_type(verified_bg):
+    pytest.importorskip("qrcode")
+
+    try:
+        response = asyncio.run(
+            local_qr_code("Test Shop", "INV001", 1500, "BG", "123456", "300")
+        )
+    finally:
+        shutdown_render_pool()
+
+    assert response["ResponseCode"] == "00"
+    assert response["QRPayload"] == build_qr_payload(*REQUEST.values())
+    assert base64.b64decode(response["QRCode"]).startswith(b"\x89PNG")
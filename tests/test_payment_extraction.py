@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from file_processing import payment_extraction
+from file_processing.payment_extraction import (
+    document_key,
+    extract_payment_candidates,
+    extract_payment_fields,
+    join_document_elements,
+)
+
+
+def test_total_is_preferred_over_subtotal():
+    text = "Subtotal: KES 1,000\nVAT: KES 160\nTotal: KES 1,160"
+
+    assert extract_payment_fields(text, None)["amount"] == 1160
+
+
+def test_spaced_sub_total_is_ignored():
+    text = "Sub Total: KES 1,000\nTotal: KES 1,160.50"
+
+    assert extract_payment_fields(text, None)["amount"] == 1160.5
+
+
+def test_amount_due_is_preferred_over_total():
+    text = "Total: KES 5,000\nAmount paid: KES 2,000\nAmount Due: KES 3,000"
+
+    assert extract_payment_fields(text, None)["amount"] == 3000
+
+
+def test_reference_label_needs_word_boundaries():
+    fields = extract_payment_fields(
+        "Delivery preference: Subtotal 1,000. Refunds are not accepted.", None
+    )
+
+    assert fields["reference"] is None
+
+
+def test_invoice_fields():
+    text = (
+        "INVOICE NO: INV-2024/01\n"
+        "Total: KES 12,500.00\n"
+        "Pay via Paybill No. 247247 Account No: ACME01\n"
+        "Call 0712 345 678. Due Date: 30/11/2026"
+    )
+
+    fields = extract_payment_fields(text, None)
+
+    assert fields["amount"] == 12500
+    assert fields["reference"] == "INV-2024/01"
+    assert fields["paybill"] == "247247"
+    assert fields["till"] is None
+    assert fields["phone_number"] == "254712345678"
+    assert fields["due_date"] == "30/11/2026"
+
+
+def test_till_and_ner_fields():
+    entities = {
+        "items": [
+            {"entity": "Acme Ltd", "type": "ORGANIZATION"},
+            {"entity": "5 May 2026", "type": "DATE"},
+        ]
+    }
+
+    fields = extract_payment_fields("Buy Goods Till 123456. Pay Ksh 300", entities)
+
+    assert fields["till"] == "123456"
+    assert fields["amount"] == 300
+    assert fields["merchant"] == "Acme Ltd"
+
+
+def test_ner_date_is_not_a_due_date():
+    entities = [{"entity": "1 May 2026", "type": "DATE"}]
+
+    fields = extract_payment_fields("Invoice date 1 May 2026", entities)
+
+    assert fields["due_date"] is None
+    assert fields["dates"] == ["1 May 2026"]
+
+
+def test_document_elements_are_joined():
+    elements = [
+        {"_id": 1, "record_id": "r1", "text": "Total: KES 900", "metadata": {"filename": "a.pdf"}},
+        {
+            "_id": 2,
+            "record_id": "r1",
+            "text": "Paybill 247247",
+            "metadata": {"filename": "a.pdf", "entities": [{"entity": "Acme", "type": "ORG"}]},
+        },
+        {"_id": 3, "text": "Call 0722000000", "metadata": {"filename": "b.pdf"}},
+    ]
+
+    assert [document_key(element) for element in elements] == ["r1", "r1", "b.pdf"]
+
+    fields = extract_payment_fields(*join_document_elements(elements[:2]))
+
+    assert fields["amount"] == 900
+    assert fields["paybill"] == "247247"
+    assert fields["merchant"] == "Acme"
+
+
+def test_documents_without_fields_are_passed_for_removal(monkeypatch):
+    elements = [
+        {"_id": 1, "record_id": "r1", "text": "Total: KES 900"},
+        {"_id": 2, "record_id": "r2", "text": "Meeting notes"},
+    ]
+    batches = [["r1", "r2"], []]
+    saved = []
+
+    monkeypatch.setattr(payment_extraction, "ensure_payment_candidate_indexes", lambda: None)
+    monkeypatch.setattr(
+        payment_extraction, "get_unextracted_document_ids", lambda batch_size: batches.pop(0)
+    )
+    monkeypatch.setattr(payment_extraction, "get_document_elements", lambda ids: elements)
+    monkeypatch.setattr(
+        payment_extraction,
+        "save_payment_candidates",
+        lambda *args: saved.append(args),
+    )
+    monkeypatch.setattr(payment_extraction, "_get_extraction_pool", ThreadPoolExecutor)
+
+    result = asyncio.run(extract_payment_candidates())
+
+    candidates, document_ids, element_ids = saved[0]
+    assert [candidate["document_id"] for candidate in candidates] == ["r1"]
+    assert document_ids == ["r1", "r2"]
+    assert element_ids == [1, 2]
+    assert result == {"documents_processed": 2, "candidates_stored": 1}
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+
+from benchmarks.profile_benchmark import run_profiles
+from file_processing.unstructured_workflow import UnstructuredPipeline
+
+
+class StandIn:
+    """Stand-in for the Unstructured API that finishes jobs after a number of polls"""
+
+    def __init__(self, polls_to_finish):
+        self.polls_to_finish = polls_to_finish
+        self.workflows = []
+        self.jobs = {}
+        self.polls = 0
+        self.created = 0
+
+    async def call_api(self, api, operation, idempotent=True, **kwargs):
+        request = kwargs.get("request")
+        name = operation.__name__
+
+        if name == "list_workflows_async":
+            workflows = [
+                workflow
+                for workflow in self.workflows
+                if request.source_id in workflow.sources
+                and request.destination_id in workflow.destinations
+            ]
+            return SimpleNamespace(response_list_workflows=workflows)
+
+        if name == "create_workflow_async":
+            self.created += 1
+            workflow = request.create_workflow
+            information = SimpleNamespace(
+                id=f"wf-{self.created}",
+                name=workflow.name,
+                sources=[workflow.source_id],
+                destinations=[workflow.destination_id],
+            )
+            self.workflows.append(information)
+            return SimpleNamespace(workflow_information=information)
+
+        if name == "run_workflow_async":
+            jobs = self.jobs.setdefault(request.workflow_id, [])
+            jobs.append({"id": f"job-{len(jobs)}", "polls": 0})
+            return SimpleNamespace(raw_response=None)
+
+        if name == "list_jobs_async":
+            self.polls += 1
+            now = datetime.now()
+            jobs = []
+            for index, job in enumerate(self.jobs.get(request.workflow_id, [])):
+                job["polls"] += 1
+                finished = job["polls"] > self.polls_to_finish
+                jobs.append(
+                    SimpleNamespace(
+                        id=job["id"],
+                        created_at=now + timedelta(seconds=index),
+                        status="COMPLETED" if finished else "IN_PROGRESS",
+                    )
+                )
+            return SimpleNamespace(response_list_jobs=jobs)
+
+        raise AssertionError(f"Unexpected call {name}")
+
+
+def benchmark(monkeypatch, stand_in, profiles, timeout):
+    async def run():
+        pipeline = UnstructuredPipeline(httpx.AsyncClient())
+        monkeypatch.setattr(pipeline, "call_api", stand_in.call_api)
+        return await run_profiles(pipeline, "src", "dest", profiles, 0, timeout)
+
+    return asyncio.run(run())
+
+
+def test_run_profiles_polls_until_jobs_finish(monkeypatch):
+    stand_in = StandIn(polls_to_finish=2)
+
+    results = benchmark(monkeypatch, stand_in, ["fast-text", "tables"], timeout=5)
+
+    assert [result["status"] for result in results] == ["COMPLETED", "COMPLETED"]
+    assert stand_in.polls > 2 * 2
+
+
+def test_run_profiles_reuses_workflows(monkeypatch):
+    stand_in = StandIn(polls_to_finish=0)
+
+    first = benchmark(monkeypatch, stand_in, ["fast-text"], timeout=5)
+    second = benchmark(monkeypatch, stand_in, ["fast-text"], timeout=5)
+
+    assert stand_in.created == 1
+    assert first[0]["workflow_id"] == second[0]["workflow_id"]
+    assert stand_in.workflows[0].name.startswith("benchmark-fast-text-")
+
+
+def test_run_profiles_times_out(monkeypatch):
+    stand_in = StandIn(polls_to_finish=10**9)
+
+    results = benchmark(monkeypatch, stand_in, ["fast-text"], timeout=0.05)
+
+    assert results[0]["status"] == "TIMEOUT"
@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from file_processing.unstructured_workflow import UnstructuredPipeline, plan_shards
+
+
+def covered(shards, key):
+    return [
+        shard
+        for shard in shards
+        if key == shard["prefix"]
+        or (
+            key.startswith(shard["prefix"])
+            and (shard["recursive"] or "/" not in key[len(shard["prefix"]):])
+        )
+    ]
+
+
+def test_root_files_get_non_recursive_shard():
+    keys = ["docs/a.pdf", "docs/b.pdf", "docs/sub/c.pdf"]
+
+    shards = plan_shards(keys, "docs/", max_shards=1)
+
+    assert shards == [
+        {"prefix": "docs/sub/", "recursive": True, "keys": ["docs/sub/c.pdf"]},
+        {"prefix": "docs/", "recursive": False, "keys": ["docs/a.pdf", "docs/b.pdf"]},
+    ]
+
+
+def test_every_key_is_covered_once():
+    keys = ["a/1.pdf", "a/2.pdf", "a/x/3.pdf", "b/4.txt", "5.pdf", "6.pdf"]
+
+    for max_shards in range(1, 8):
+        shards = plan_shards(keys, "", max_shards)
+        for key in keys:
+            assert len(covered(shards, key)) == 1, (max_shards, key, shards)
+
+
+def test_flat_source_is_one_shard_unless_every_file_fits():
+    #Connectors select by prefix, so files at one level cannot be grouped
+    keys = [f"invoice-{i}.pdf" for i in range(5)]
+
+    assert len(plan_shards(keys, "", max_shards=1)) == 1
+    assert len(plan_shards(keys, "", max_shards=5)) == 5
+    assert len(plan_shards(keys, "", max_shards=3)) == 1
+
+
+def test_largest_folder_is_split_first():
+    keys = ["big/x/1.pdf", "big/y/2.pdf", "big/y/3.pdf", "small/4.pdf"]
+
+    shards = plan_shards(keys, "", max_shards=3)
+
+    assert [shard["prefix"] for shard in shards] == ["big/x/", "big/y/", "small/"]
+
+
+def fake_pipeline(monkeypatch, shard_count, workflows):
+    """Pipeline whose jobs finish on the second poll, recording concurrent jobs"""
+    pipeline = UnstructuredPipeline(httpx.AsyncClient())
+    state = {"running": set(), "max_running": 0, "polls": {}, "sources": []}
+
+    monkeypatch.setattr(
+        pipeline,
+        "list_shards",
+        lambda max_shards: [
+            {"url": f"s3://bucket/{i}/", "recursive": True, "extensions": {".pdf"}}
+            for i in range(shard_count)
+        ],
+    )
+
+    async def find_source_connector(name):
+        return next((s for s in state["sources"] if s.name == name), None)
+
+    async def create_source_connector(name, remote_url=None, recursive=True):
+        source = SimpleNamespace(id=f"src-{name}", name=name)
+        state["sources"].append(source)
+        return source
+
+    async def find_workflows(prefix):
+        return [w for w in workflows if w.name.startswith(prefix)]
+
+    async def create_workflow_unstructured(name, source_id, destination_id, profile):
+        for workflow in workflows:
+            if workflow.name == name and workflow.sources == [source_id]:
+                return workflow
+        workflow = SimpleNamespace(
+            id=f"wf-{name}", name=name, sources=[source_id], destinations=[destination_id]
+        )
+        workflows.append(workflow)
+        return workflow
+
+    async def run_workflow_unstructured(workflow_id):
+        state["running"].add(workflow_id)
+        state["max_running"] = max(state["max_running"], len(state["running"]))
+
+    async def get_latest_job(workflow_id):
+        if workflow_id not in state["running"]:
+            return None
+        polls = state["polls"][workflow_id] = state["polls"].get(workflow_id, 0) + 1
+        if polls < 2:
+            return SimpleNamespace(id=f"job-{workflow_id}", status="IN_PROGRESS")
+        state["running"].discard(workflow_id)
+        return SimpleNamespace(id=f"job-{workflow_id}", status="COMPLETED")
+
+    for name, method in [
+        ("find_source_connector", find_source_connector),
+        ("create_source_connector", create_source_connector),
+        ("find_workflows", find_workflows),
+        ("create_workflow_unstructured", create_workflow_unstructured),
+        ("run_workflow_unstructured", run_workflow_unstructured),
+        ("get_latest_job", get_latest_job),
+    ]:
+        monkeypatch.setattr(pipeline, name, method)
+
+    return pipeline, state
+
+
+def test_concurrency_slot_is_held_until_job_finishes(monkeypatch):
+    async def run():
+        pipeline, state = fake_pipeline(monkeypatch, shard_count=5, workflows=[])
+        shards = await pipeline.run_sharded_workflow(
+            "job", "dest", max_concurrency=2, poll_interval=0
+        )
+        await pipeline.sharded_tasks["job"]
+        return shards, state
+
+    shards, state = asyncio.run(run())
+
+    assert state["max_running"] == 2
+    assert [shard["status"] for shard in shards] == ["COMPLETED"] * 5
+
+
+def test_shard_workflows_are_found_by_name_after_restart(monkeypatch):
+    workflows = []
+
+    async def run():
+        first, _ = fake_pipeline(monkeypatch, shard_count=2, workflows=workflows)
+        await first.run_sharded_workflow("job", "dest", poll_interval=0)
+        await first.sharded_tasks["job"]
+
+        #A new process finds the same workflows by name instead of creating new ones
+        second, _ = fake_pipeline(monkeypatch, shard_count=2, workflows=workflows)
+        status = await second.get_sharded_workflow_status("job")
+        await second.run_sharded_workflow("job", "dest", poll_interval=0)
+        await second.sharded_tasks["job"]
+        return status
+
+    status = asyncio.run(run())
+
+    assert len(workflows) == 2
+    assert all(w.name.startswith("job-shard-") for w in workflows)
+    assert status["summary"] == {"NOT_STARTED": 2}
@@ -0,0 +1,31 @@
+import asyncio
+
+import httpx
+
+from file_processing.unstructured_workflow import (
+    UnstructuredPipeline,
+    create_unstructured_http_client,
+)
+
+
+def test_sdk_requests_use_client_timeouts(monkeypatch):
+    monkeypatch.setenv("UNSTRUCTURED_CONNECT_TIMEOUT", "3")
+    monkeypatch.setenv("UNSTRUCTURED_READ_TIMEOUT", "45")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=[])
+
+    async def run():
+        async with create_unstructured_http_client(httpx.MockTransport(handler)) as client:
+            pipeline = UnstructuredPipeline(client)
+            return await pipeline.get_latest_job("workflow-id")
+
+    assert asyncio.run(run()) is None
+    assert requests[0].extensions["timeout"] == {
+        "connect": 3.0,
+        "read": 45.0,
+        "write": 45.0,
+        "pool": 45.0,
+    }
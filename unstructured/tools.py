@@ -1,5 +1,7 @@
 from mcp.server.fastmcp import Context
-from database.database import get_analyzed_documents
+from database.database import get_analyzed_documents, get_payment_candidates
+from file_processing.payment_extraction import extract_payment_candidates
+import json
 
 
 def register_unstructured_tools(mcp):
@@ -41,7 +43,11 @@ def register_unstructured_tools(mcp):
 
     @mcp.tool()
     async def create_workflow(
-        ctx: Context, workflow_name: str, source_id: str, destination_id: str
+        ctx: Context,
+        workflow_name: str,
+        source_id: str,
+        destination_id: str,
+        profile: str = "full-ocr-ner",
     ):
         """
         This tool help create a workflow the workflow to process the data from the source connector to the destination connector
@@ -50,6 +56,7 @@ def register_unstructured_tools(mcp):
             workflow_name (str): The name of the workflow to create.
             source_id (str): The id of the source connector.
             destination_id (str): The id of the destination connector.
+            profile (str): The pipeline profile to use, e.g. fast-text, tables or full-ocr-ner. Use list_pipeline_profiles to see all profiles.
 
         Returns:
             str: String
@@ -58,10 +65,23 @@ def register_unstructured_tools(mcp):
             ctx.request_context.lifespan_context.unstructured_pipeline
         )
         response = await unstructured_pipeline.create_workflow_unstructured(
-            workflow_name, source_id, destination_id
+            workflow_name, source_id, destination_id, profile
         )
         return f"Workflow name: {response.name} \n Workflow id: {response.id} \n Workflow status: {response.status} \n Workflow type: {response.workflow_type} \n Source(s): {response.sources} \n Destination(s): {response.destinations} \n Schedule(s): {response.schedule.crontab_entries}"
 
+    @mcp.tool()
+    async def list_pipeline_profiles(ctx: Context):
+        """
+        This tool help list the pipeline profiles available for creating workflows and their partitioner and NER settings.
+
+        Returns:
+            str: JSON formatted pipeline profiles
+        """
+        unstructured_pipeline = (
+            ctx.request_context.lifespan_context.unstructured_pipeline
+        )
+        return json.dumps(unstructured_pipeline.profiles, indent=2)
+
     @mcp.tool()
     async def run_workflow(ctx: Context, workflow_id: str):
         """
@@ -96,6 +116,64 @@ def register_unstructured_tools(mcp):
         response = await unstructured_pipeline.get_workflow(workflow_id)
         return f"Workflow name: {response.name} \n Workflow id: {response.id} \n Workflow status: {response.status}"
 
+    @mcp.tool()
+    async def run_sharded_workflow(
+        ctx: Context,
+        job_name: str,
+        destination_id: str,
+        max_concurrency: int = 4,
+        max_shards: int = 8,
+    ):
+        """
+        This tool help process a large source by splitting it into prefix shards and running one workflow per shard in the background. Shards that only hold plain text files use the cheaper fast-text-ner profile, which skips OCR but keeps NER. Shards are split by folder, so a flat folder with more files than max_shards stays a single shard. Use get_sharded_workflow_status to follow progress.
+
+        Args:
+            job_name (str): The name of the sharded job.
+            destination_id (str): The id of the destination connector.
+            max_concurrency (int): The maximum number of shard jobs processing at once.
+            max_shards (int): The number of shards to split the source into. A source with more top level folders gets one shard per folder.
+
+        Returns:
+            str: JSON formatted list of planned shards
+        """
+        unstructured_pipeline = (
+            ctx.request_context.lifespan_context.unstructured_pipeline
+        )
+        response = await unstructured_pipeline.run_sharded_workflow(
+            job_name, destination_id, max_concurrency, max_shards
+        )
+        return json.dumps(response, indent=2)
+
+    @mcp.tool()
+    async def get_sharded_workflow_status(ctx: Context, job_name: str):
+        """
+        This tool help get the combined status of a sharded job, with a summary and the status of the latest job of every shard workflow.
+
+        Args:
+            job_name (str): The name of the sharded job.
+
+        Returns:
+            str: JSON formatted job status
+        """
+        unstructured_pipeline = (
+            ctx.request_context.lifespan_context.unstructured_pipeline
+        )
+        response = await unstructured_pipeline.get_sharded_workflow_status(job_name)
+        return json.dumps(response, indent=2)
+
+    @mcp.tool()
+    async def get_unstructured_latency(ctx: Context):
+        """
+        This tool help get the number of calls, average and maximum latency of every Unstructured API operation made by the server.
+
+        Returns:
+            str: JSON formatted latency per operation
+        """
+        unstructured_pipeline = (
+            ctx.request_context.lifespan_context.unstructured_pipeline
+        )
+        return json.dumps(unstructured_pipeline.get_call_latencies(), indent=2)
+
     @mcp.tool()
     async def fetch_documents():
         """
@@ -105,3 +183,30 @@ def register_unstructured_tools(mcp):
             str: String
         """
         return get_analyzed_documents()
+
+    @mcp.tool()
+    async def extract_payments(batch_size: int = 100):
+        """
+        This tool help extract payment details (amount, phone number, till or paybill, reference, due date) from analyzed documents that have not been processed yet and store them as payment candidates.
+
+        Args:
+            batch_size (int): The number of documents to process per batch.
+
+        Returns:
+            str: JSON formatted count of processed documents and stored candidates
+        """
+        response = await extract_payment_candidates(batch_size)
+        return json.dumps(response, indent=2)
+
+    @mcp.tool()
+    async def list_payment_candidates(limit: int = 20):
+        """
+        This tool help list payment candidates extracted from analyzed documents, most recently extracted first, ready to be used for stk_push or QR code generation.
+
+        Args:
+            limit (int): The maximum number of candidates to return.
+
+        Returns:
+            str: JSON formatted payment candidates
+        """
+        return json.dumps(get_payment_candidates(limit), indent=2, default=str)